@@ -1,7 +1,7 @@
 import datetime
-import hashlib
 import json
 import re
+import sys
 import time
 from typing import Optional, Set, Callable, Union, Iterable, Tuple, List, Dict
 
@@ -160,7 +160,7 @@ class TickerListFactory:
         if len(ticker) > TickerListFactory.max_ticker_length:
             return False
 
-        return re.fullmatch(TickerListFactory.ticker_pattern, ticker) is not None
+        return TickerListFactory.ticker_pattern.fullmatch(ticker) is not None
 
     @staticmethod
     def _load_json(ticker_list_path: str) -> Tuple[dict, bool]:
@@ -186,6 +186,13 @@ class TickerListFactory:
                 if not TickerListFactory._is_valid_ticker_list(ticker_list['tickers'][date]):
                     raise ValueError("Invalid ticker list.")
 
+            # The same tickers appear in the list for almost every date, and the JSON decoder creates a new string for
+            # each occurrence. Interning them means each ticker is stored once and shared by every list (and every
+            # position opened from them).
+            ticker_list['tickers'] = {
+                date: [sys.intern(ticker) for ticker in tickers] for date, tickers in ticker_list['tickers'].items()
+            }
+
         return ticker_list, is_historical_list
 
     @staticmethod
@@ -225,8 +232,7 @@ class TradingBot:
         """
 
         self.tickers = tickers
-        sha1_hash = hashlib.sha1(bytes(int(time.time())))
-        self.name = name if name else self.__class__.__name__ + '_' + sha1_hash.hexdigest()
+        self.name = name if name else f'{self.__class__.__name__}_{int(time.time()):x}'
         self.portfolio_id: Optional[PortfolioID] = None
         self.initial_contribution = initial_deposit
         self.contribution_scheduler = contribution_scheduler
@@ -351,22 +357,28 @@ class BuyAndHoldBot(TradingBot):
     def update(self, today: datetime.datetime, broker: Broker):
         super(BuyAndHoldBot, self).update(today, broker)
 
+        # The schedule only depends on the date, so check it once per update rather than once per ticker.
+        if not self.buy_schedule.has_period_elapsed(today, self.prev_purchase_date):
+            return
+
         for ticker in self.tickers:
             ticker_prefix = f'[{ticker}]'
             log_prefix = f'[{today}] {ticker_prefix:6s}'
 
-            if self.buy_schedule.has_period_elapsed(today, self.prev_purchase_date):
-                market_price = broker.get_quote(ticker)[0]['close']
-                balance = broker.get_balance(self.portfolio_id)
-                quantity = self.buy_quantity(balance, market_price)
+            market_price = broker.get_quote(ticker)[0]['close']
+            balance = broker.get_balance(self.portfolio_id)
+            quantity = self.buy_quantity(balance, market_price)
 
-                if quantity > 0:
-                    try:
-                        broker.execute_buy_order(ticker, quantity, self.portfolio_id)
-                        self.prev_purchase_date = today
-                        print(f'{log_prefix} Opened new position: {quantity} share(s) @ {market_price:.2f}')
-                    except InsufficientFundsError:
-                        pass
+            if quantity > 0:
+                try:
+                    broker.execute_buy_order(ticker, quantity, self.portfolio_id)
+                    self.prev_purchase_date = today
+                    print(f'{log_prefix} Opened new position: {quantity} share(s) @ {market_price:.2f}')
+                except InsufficientFundsError:
+                    pass
+                else:
+                    # A purchase resets the schedule, so the period cannot have elapsed for the remaining tickers.
+                    break
 
 
 class MACDBot(TradingBot):
@@ -392,22 +404,27 @@ class MACDBot(TradingBot):
             except KeyError:
                 continue
 
-            ticker_prefix = f'[{ticker}]'
-            log_prefix = f'[{today}] {ticker_prefix:6s}'
-
             try:
-                has_bullish_crossover = data['signal_line'] < data['macd_line'] < 0 and prev_data['macd_line'] <= \
-                                        prev_data['signal_line']
-                should_buy = data['macd_histogram'] > 0 and has_bullish_crossover
+                macd_line, signal_line, macd_histogram = data['macd_line'], data['signal_line'], data['macd_histogram']
+                prev_macd_line, prev_signal_line = prev_data['macd_line'], prev_data['signal_line']
+
+                has_bullish_crossover = signal_line < macd_line < 0 and prev_macd_line <= prev_signal_line
+                should_buy = macd_histogram > 0 and has_bullish_crossover
 
-                has_bearish_crossover = 0 < data['macd_line'] < data['signal_line'] and prev_data['macd_line'] >= \
-                                        prev_data['signal_line']
-                should_sell = data['macd_histogram'] < 0 and has_bearish_crossover
+                has_bearish_crossover = 0 < macd_line < signal_line and prev_macd_line >= prev_signal_line
+                should_sell = macd_histogram < 0 and has_bearish_crossover
             # TypeError raised when `prev_data` is None or any of ['macd_line', 'signal_line', 'histogram'] are None for
             # `data` or `prev_data`.
             except TypeError:
                 continue
 
+            if not (should_buy or should_sell):
+                continue
+
+            # Most days have no crossover, so the log prefix is only formatted for the tickers that are traded.
+            ticker_prefix = f'[{ticker}]'
+            log_prefix = f'[{today}] {ticker_prefix:6s}'
+
             if should_buy:
                 market_price = data['close']
                 balance = broker.get_balance(self.portfolio_id)
@@ -1,13 +1,15 @@
+import bisect
 import datetime
 import sqlite3
 import sys
+import weakref
 from collections import defaultdict
 from typing import Dict, List, DefaultDict, Optional, Union, Any, Tuple, Set, Generator
 
 from AlgoTrader.portfolio import Portfolio
 from AlgoTrader.position import Position
 from AlgoTrader.types import PortfolioID, Ticker, PositionID, TransactionType, Transaction, BuyOrder
-from AlgoTrader.utils import Scheduler
+from AlgoTrader.utils import Scheduler, tune_db_connection
 
 
 # TODO: Create local transaction log (which syncs with the database, ideally asynchronously) and keep running totals.
@@ -37,6 +39,13 @@ class Broker:
     """
     transactions_that_require_position_ids = {TransactionType.SELL, TransactionType.DIVIDEND,
                                               TransactionType.CASH_SETTLEMENT}
+    # Shared by the single and batched insert paths so that both use the same prepared statement.
+    insert_transaction_sql = '''
+        INSERT INTO transactions (portfolio_id, position_id, type, quantity, price, timestamp) 
+            VALUES (?, ?, ?, ?, ?, ?)
+        '''
+    # The number of trading days of stock data that are read from the database at a time.
+    prefetch_days = 64
 
     def __init__(self, spx_changes: dict, database_connection: sqlite3.Connection, report_schedule: Scheduler):
         """
@@ -52,6 +61,7 @@ class Broker:
         self.stock_data: Dict[Ticker, Dict[str, Any]] = dict()
         self.yesterdays_stock_data: Dict[Ticker, Dict[str, Any]] = dict()
         self.last_known_prices: Dict[Ticker, Dict[str, float]] = dict()
+        self.prefetched_stock_data: Dict[datetime.datetime, Dict[Ticker, Dict[str, Any]]] = dict()
 
         self.spx_changes: Dict[str, Dict[str, Dict[str: str]]] = spx_changes
 
@@ -60,6 +70,9 @@ class Broker:
 
         self.db_connection = database_connection
         self.db_connection.row_factory = sqlite3.Row
+        # Close the connection once the broker is garbage collected. Unlike `__del__`, this does not keep brokers that
+        # are part of a reference cycle from being collected and is guaranteed to be called at most once.
+        weakref.finalize(self, self.db_connection.close)
 
         # TODO: Read portfolios and positions from database?
         self.portfolios: Dict[PortfolioID, Portfolio] = dict()
@@ -71,15 +84,21 @@ class Broker:
         self.transactions_queue: List[Transaction] = list()
         self._in_batch_mode: bool = False
 
-        self.dates_with_data = list(
-            map(
-                lambda row: row['datetime'],
-                self.db_connection.execute('SELECT DISTINCT datetime FROM daily_stock_data ORDER BY datetime')
-            )
-        )
+        # The dates are read (and parsed) up front rather than streamed from the cursor since the same connection is
+        # written to (and committed) while the dates are iterated over. Only one column is selected, so plain tuples are
+        # used rather than building a `sqlite3.Row` for each date.
+        cursor = self.db_connection.cursor()
+        cursor.row_factory = None
+
+        self.dates_with_data: List[datetime.datetime] = [
+            datetime.datetime.fromisoformat(row[0])
+            for row in cursor.execute('SELECT DISTINCT datetime FROM daily_stock_data ORDER BY datetime')
+        ]
+
+        cursor.close()
 
         try:
-            self.today = datetime.datetime.fromisoformat(self.dates_with_data[0])
+            self.today = self.dates_with_data[0]
             self.yesterday = self.today - datetime.timedelta(1)
             self.most_recent_fetch_date = datetime.datetime.fromtimestamp(0.0)
         except IndexError:
@@ -88,18 +107,49 @@ class Broker:
 
         self._fetch_daily_data()
 
-    def __del__(self):
-        self.db_connection.close()
-
     @staticmethod
     def from_config(config: dict) -> 'Broker':
         spx_changes = config['spx_change_list']
         db_connection = sqlite3.connect(config['database_path'])
+        tune_db_connection(db_connection)
         report_schedule = Scheduler.from_string(config['report_frequency'])
 
         return Broker(spx_changes, db_connection, report_schedule)
 
     def _fetch_daily_data(self):
+        # The buffer holds every trading date in the range it was read for, so a trading date missing from it lies
+        # outside that range. Dates without any data (e.g. weekends) get no data and leave the buffer alone.
+        if self.today not in self.prefetched_stock_data and self._is_trading_date(self.today):
+            self._prefetch_daily_data()
+
+        self.yesterdays_stock_data = self.stock_data
+        self.stock_data = self.prefetched_stock_data.get(self.today, dict())
+
+        self.last_known_prices.update(self.stock_data)
+
+        self.most_recent_fetch_date = self.today
+
+    def _is_trading_date(self, date: datetime.datetime) -> bool:
+        """
+        Check whether there is any stock data for a given date.
+
+        :param date: The date to check.
+        :return: True if `date` is one of the dates with data, False otherwise.
+        """
+        i = bisect.bisect_left(self.dates_with_data, date)
+
+        return i < len(self.dates_with_data) and self.dates_with_data[i] == date
+
+    def _prefetch_daily_data(self):
+        """
+        Read the stock data for the next `prefetch_days` trading days, starting from today, in a single range query.
+
+        This replaces a query per day with one per chunk of days, since the dates are always visited in order.
+        """
+        start = bisect.bisect_left(self.dates_with_data, self.today)
+        end = min(start + self.prefetch_days, len(self.dates_with_data)) - 1
+        end_date = self.dates_with_data[end] if end >= start else self.today
+
         cursor = self.db_connection.execute(
             '''
             SELECT 
@@ -107,30 +157,28 @@ class Broker:
                 macd_histogram, macd_line, signal_line, 
                 split_coefficient, dividend_amount
             FROM daily_stock_data
-            WHERE datetime = ?
+            WHERE datetime BETWEEN ? AND ?
             ''',
-            (self.today,)
+            (self.today, end_date)
         )
 
-        self.yesterdays_stock_data = self.stock_data
-        self.stock_data = {row['ticker']: row for row in cursor}
-        cursor.close()
+        stock_data_by_date: Dict[str, Dict[Ticker, Dict[str, Any]]] = dict()
 
-        for ticker in self.stock_data:
-            self.last_known_prices[ticker] = self.stock_data[ticker]
+        for row in cursor:
+            stock_data_by_date.setdefault(row['datetime'], dict())[row['ticker']] = row
 
-        self.most_recent_fetch_date = self.today
+        cursor.close()
+
+        self.prefetched_stock_data = {
+            datetime.datetime.fromisoformat(date): stock_data for date, stock_data in stock_data_by_date.items()
+        }
 
     def iterate_dates(self) -> Generator[Tuple[datetime.datetime, datetime.datetime], None, None]:
         """
         Iterate through the dates in the stock data.
         :return: Yields 2-tuples containing the current date and the previous date.
         """
-        for i in range(1, len(self.dates_with_data)):
-            today = datetime.datetime.fromisoformat(self.dates_with_data[i])
-            yesterday = datetime.datetime.fromisoformat(self.dates_with_data[i - 1])
-
-            yield today, yesterday
+        yield from zip(self.dates_with_data[1:], self.dates_with_data)
 
     def create_portfolio(self, owner_name: str, initial_contribution: float = 0.00) -> PortfolioID:
         """
@@ -186,38 +234,38 @@ class Broker:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         with self.db_connection:
-            positions_to_insert = list()
-
-            next_position_id: int = \
-                self.db_connection.execute("SELECT IFNULL(MAX(id), 0) AS max_id FROM position").fetchone()['max_id'] + 1
-
-            for (portfolio_id, ticker, quantity, price, order_date) in self.buy_order_queue:
-                position_id = PositionID(next_position_id)
-
-                # Refund the prepaid amount to keep the account in balance.
-                self.portfolios[portfolio_id].refund_unfilled_buy_order(quantity * price)
-                position = self.portfolios[portfolio_id].open_position(ticker, price, quantity, order_date, position_id)
-                self.position_by_id[position.id] = position
-                self.positions_by_ticker[ticker].append(position)
-
-                positions_to_insert.append((position_id, portfolio_id, ticker))
-                self.transactions_queue.append(
-                    (portfolio_id, position_id, TransactionType.BUY.value, quantity, price, order_date))
-
-                next_position_id += 1
-
-            self.db_connection.executemany(
-                "INSERT INTO position (id, portfolio_id, ticker) VALUES (?, ?, ?)",
-                positions_to_insert
-            )
+            # Most batches (e.g. a day of trading) have no buy orders, so only look up the next position ID and insert
+            # positions when there is something to insert.
+            if self.buy_order_queue:
+                positions_to_insert = list()
+
+                next_position_id: int = self.db_connection.execute(
+                    "SELECT IFNULL(MAX(id), 0) AS max_id FROM position"
+                ).fetchone()['max_id'] + 1
+
+                for (portfolio_id, ticker, quantity, price, order_date) in self.buy_order_queue:
+                    position_id = PositionID(next_position_id)
+
+                    # Refund the prepaid amount to keep the account in balance.
+                    self.portfolios[portfolio_id].refund_unfilled_buy_order(quantity * price)
+                    position = self.portfolios[portfolio_id].open_position(ticker, price, quantity, order_date,
+                                                                           position_id)
+                    self.position_by_id[position.id] = position
+                    self.positions_by_ticker[ticker].append(position)
+
+                    positions_to_insert.append((position_id, portfolio_id, ticker))
+                    self.transactions_queue.append(
+                        (portfolio_id, position_id, TransactionType.BUY.value, quantity, price, order_date))
+
+                    next_position_id += 1
+
+                self.db_connection.executemany(
+                    "INSERT INTO position (id, portfolio_id, ticker) VALUES (?, ?, ?)",
+                    positions_to_insert
+                )
 
-            self.db_connection.executemany(
-                '''
-                INSERT INTO transactions (portfolio_id, position_id, type, quantity, price, timestamp) 
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''',
-                self.transactions_queue
-            )
+            if self.transactions_queue:
+                self.db_connection.executemany(Broker.insert_transaction_sql, self.transactions_queue)
 
         self._in_batch_mode = False
 
@@ -268,7 +316,9 @@ class Broker:
         :param ticker: (optional) The ticker of the security to buy. Must be specified for buy orders.
         :return:
         """
-        self._check_transaction_preconditions(transaction_type, ticker, quantity, position_id)
+        # The checks are only assertions, so skip the call entirely when running with `python -O`.
+        if __debug__:
+            self._check_transaction_preconditions(transaction_type, ticker, quantity, position_id)
 
         portfolio = self.portfolios[portfolio_id]
 
@@ -311,10 +361,7 @@ class Broker:
         else:
             with self.db_connection:
                 self.db_connection.execute(
-                    '''
-                    INSERT INTO transactions (portfolio_id, position_id, type, quantity, price, timestamp) 
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''',
+                    Broker.insert_transaction_sql,
                     (portfolio.id, position_id, transaction_type.value, quantity, price, self.today)
                 )
 
@@ -414,7 +461,7 @@ class Broker:
             # We close any positions that trade in securities that have been taken off SPX as a quick fix.
             # TODO: Only close positions if a company has been delisted.
             if len(ticker) > 0:
-                for position in filter(lambda p: not p.is_closed, self.positions_by_ticker[ticker]):
+                for position in [p for p in self.positions_by_ticker[ticker] if not p.is_closed]:
                     self.close_position(position)
 
         for ticker in self.stock_data:
@@ -423,14 +470,14 @@ class Broker:
             if row['dividend_amount'] > 0:
                 # TODO: Only pay dividend for shares that were owned prior to the ex-dividend date.
                 # TODO: Get data for ex-dividend dates.
-                for position in filter(lambda p: not p.is_closed, self.positions_by_ticker[row['ticker']]):
+                for position in [p for p in self.positions_by_ticker[row['ticker']] if not p.is_closed]:
                     self._execute_transaction(TransactionType.DIVIDEND, position.portfolio_id, row['dividend_amount'],
                                               position_id=position.id)
 
             if abs(row['split_coefficient'] - 1) > sys.float_info.epsilon:  # roughly equal to
                 # Need to make list here to avoid positions being added during stock split which the filter then
                 # iterates up to, splitting that stock again, and again ad infinitum....
-                positions = list(filter(lambda p: not p.is_closed, self.positions_by_ticker[row['ticker']]))
+                positions = [p for p in self.positions_by_ticker[row['ticker']] if not p.is_closed]
 
                 for position in positions:
                     whole_shares, fractional_shares, adjusted_price, cash_settlement_amount = \
@@ -444,5 +491,5 @@ class Broker:
                         self.close_position(position, price=0)
                     else:
                         self.close_position(position, price=position.entry_price)
-                        self.execute_buy_order(position.ticker, int(whole_shares), position.portfolio_id,
+                        self.execute_buy_order(position.ticker, whole_shares, position.portfolio_id,
                                                adjusted_price)
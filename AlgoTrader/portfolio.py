@@ -26,11 +26,21 @@ class Portfolio:
     :attribute open_positions: The subset of `positions` that contains all open positions in this portfolio.
     :attribute closed_positions: The subset of `positions` that contains all closed positions in this portfolio.
     :attribute positions_by_id: The set of positions belonging to this portfolio indexed by their ID.
+    :attribute closed_position_cost: The running total of the cost of all closed positions in this portfolio.
+    :attribute closed_position_value: The running total of the exit value of all closed positions in this portfolio.
+    :attribute last_closed_timestamp: When the most recently closed position was closed, None if no position has been
+                                      closed yet.
     :attribute taxes_paid: How much taxes this portfolio has paid to date.
     :attribute taxes_owing: How much taxes this portfolio owes at present.
     :attribute db_connection: A database connection that allows querying for portfolio related data.
     """
 
+    __slots__ = (
+        'id', 'owner_name', 'date_created', 'balance', 'contribution', 'taxes_paid', 'taxes_owing', 'tickers',
+        'positions', 'open_positions', 'open_positions_by_ticker', 'closed_positions', 'positions_by_id',
+        'closed_position_cost', 'closed_position_value', 'last_closed_timestamp', 'db_connection'
+    )
+
     def __init__(self, owner_name: str, date_created: datetime.datetime,
                  db_connection: sqlite3.Connection):
         """
@@ -51,24 +61,31 @@ class Portfolio:
         self.open_positions_by_ticker: DefaultDict[Ticker, Set[Position]] = defaultdict(lambda: set())
         self.closed_positions: Set[Position] = set()
         self.positions_by_id: Dict[PositionID, Position] = dict()
+        self.closed_position_cost: float = 0.0
+        self.closed_position_value: float = 0.0
+        self.last_closed_timestamp: Optional[datetime.datetime] = None
 
         self.owner_name = owner_name
 
         self.db_connection = db_connection
 
         with self.db_connection:
-            cursor = self.db_connection.execute('''
-                    INSERT INTO portfolio (owner_name) VALUES (?)
-                    ''', (self.owner_name,))
-
-            self.id = PortfolioID(cursor.lastrowid)
-            cursor.close()
+            self.id = PortfolioID(self.db_connection.execute(
+                "INSERT INTO portfolio (owner_name) VALUES (?)",
+                (self.owner_name,)
+            ).lastrowid)
 
     def open_position(self, ticker: Ticker, price: float, quantity: int,
                       timestamp: datetime.datetime, position_id: Optional[PositionID] = None) -> Position:
         """
         Open a position and add it to this portfolio.
 
+        Note:
+        - If `position_id` is not specified, the position is inserted into the database but this is not committed. The
+        caller is responsible for committing it (e.g. together with the corresponding transaction inside a
+        `with db_connection:` block, as `Broker` does), otherwise the row is left in an open implicit transaction
+        until the next commit on the connection.
+
         :param ticker: The ticker of the security that is being bought.
         :param price: The current price of the security.
         :param quantity: How many shares of the security that is being bought.
@@ -114,6 +131,12 @@ class Portfolio:
         self.open_positions_by_ticker[position.ticker].discard(position)
         self.closed_positions.add(position)
 
+        self.closed_position_cost += position.cost
+        self.closed_position_value += position.exit_value
+
+        if self.last_closed_timestamp is None or timestamp > self.last_closed_timestamp:
+            self.last_closed_timestamp = timestamp
+
     def create_summary(self, period_end: datetime.datetime,
                        period_start: Optional[datetime.datetime] = None,
                        last_known_prices: Optional[Dict[Ticker, Dict[str, Any]]] = None) -> 'PortfolioSummary':
@@ -240,10 +263,12 @@ class Portfolio:
 
         :param amount: The amount to deduct from the portfolio.
         """
-        if amount > self.balance:
+        balance = self.balance
+
+        if amount > balance:
             raise InsufficientFundsError(f"Not enough funds to deduct {amount}.")
         else:
-            self.balance -= amount
+            self.balance = balance - amount
 
 
 # TODO: Update to use data from database.
@@ -253,6 +278,20 @@ class Portfolio:
 class PortfolioSummary:
     """Summary report of the performance of the portfolio."""
 
+    __slots__ = (
+        'portfolio_id', 'portfolio_owner', 'date_created', 'period_start', 'period_end', 'portfolio_age',
+        'total_deposits', 'total_withdrawals', 'total_dividends_received', 'total_cash_settlements_received',
+        'total_taxes_paid', 'total_taxes_owing', 'total_taxes', 'total_num_closed_positions',
+        'total_num_open_positions', 'total_closed_position_cost', 'total_closed_position_value',
+        'total_open_position_cost', 'total_open_position_value', 'total_num_positions', 'total_position_cost',
+        'total_position_value', 'total_adjustments', 'net_pl', 'net_realised_pl', 'net_unrealised_pl',
+        'net_pl_percentage', 'net_realised_pl_percentage', 'net_unrealised_pl_percentage', 'revenue', 'expenses',
+        'net_income', 'net_contribution', 'accounts_receivable', 'available_cash', 'assets', 'equity',
+        'equity_change', 'equity_cagr', '_formatted'
+    )
+
+    divider = '#' * 80
+
     def __init__(self, portfolio: Portfolio, db_connection: sqlite3.Connection, period_end: datetime.datetime,
                  period_start: Optional[datetime.datetime] = None,
                  last_known_prices: Dict[Ticker, Dict[str, Any]] = None):
@@ -266,7 +305,8 @@ class PortfolioSummary:
         :param last_known_prices: (optional) The last known prices as of the period end. If this is None, then the
         prices are fetched from the database (this may be quite slow).
         """
-        if not last_known_prices:
+        # Prices are only needed to value open positions, so skip the (slow) query if there are none.
+        if not last_known_prices and portfolio.open_positions:
             if period_start is None:
                 cursor = db_connection.execute(
                     f'''
@@ -356,21 +396,38 @@ class PortfolioSummary:
         self.total_open_position_cost: float = 0.0
         self.total_open_position_value: float = 0.0
 
-        for position in portfolio.positions:
-            if not position.is_closed and position.opened_timestamp >= self.period_start:
+        # Open positions in the same security share a price, so add up the shares held per ticker and value each
+        # ticker once instead of looking up the price for every position.
+        open_quantity_by_ticker: DefaultDict[Ticker, int] = defaultdict(int)
+
+        # The portfolio already keeps its open and closed positions apart, so read those subsets directly rather than
+        # scanning every position and checking whether it is closed.
+        for position in portfolio.open_positions:
+            if position.opened_timestamp >= self.period_start:
                 self.total_num_open_positions += 1
                 self.total_open_position_cost += position.cost
-
-                try:
-                    stock_price = last_known_prices[position.ticker]['close']
-
-                    self.total_open_position_value += position.current_value(stock_price)
-                except KeyError:
-                    print(f'WARNING: Missing stock prices for {position.ticker}.')
-            elif position.is_closed and position.closed_timestamp <= self.period_end:
-                self.total_num_closed_positions += 1
-                self.total_closed_position_cost += position.cost
-                self.total_closed_position_value += position.exit_value
+                open_quantity_by_ticker[position.ticker] += position.quantity
+
+        for ticker, quantity in open_quantity_by_ticker.items():
+            try:
+                stock_price = last_known_prices[ticker]['close']
+
+                self.total_open_position_value += quantity * stock_price
+            except KeyError:
+                print(f'WARNING: Missing stock prices for {ticker}.')
+
+        # Closed positions never change once closed, so if every one of them falls inside the reporting period the
+        # portfolio's running totals can be used instead of adding up each position again.
+        if portfolio.last_closed_timestamp is None or portfolio.last_closed_timestamp <= self.period_end:
+            self.total_num_closed_positions = len(portfolio.closed_positions)
+            self.total_closed_position_cost = portfolio.closed_position_cost
+            self.total_closed_position_value = portfolio.closed_position_value
+        else:
+            for position in portfolio.closed_positions:
+                if position.closed_timestamp <= self.period_end:
+                    self.total_num_closed_positions += 1
+                    self.total_closed_position_cost += position.cost
+                    self.total_closed_position_value += position.exit_value
 
         self.total_num_positions = self.total_num_open_positions + self.total_num_closed_positions
         self.total_position_cost = self.total_open_position_cost + self.total_closed_position_cost
@@ -413,6 +470,9 @@ class PortfolioSummary:
         self.equity_change = (self.equity / self.total_deposits * 100) - 100
         self.equity_cagr = (self.equity / self.total_deposits) ** (1 / self.portfolio_age) - 1
 
+        # The summary does not change once created, so the formatted report is built once on first use.
+        self._formatted: Optional[str] = None
+
     def upload(self, db_connection: sqlite3.Connection):
         """Upload the report to the database.
 
@@ -494,50 +554,47 @@ class PortfolioSummary:
         )
 
     def __str__(self) -> str:
-        result = ''
-
-        # TODO: Use multiline string instead.
-        result += '#' * 80 + '\n'
-        result += f'Summary of Portfolio #{self.portfolio_id}\n'
-        result += f' held on behalf of {self.portfolio_owner}\n'
-        result += f' for the period {self.period_start.date()} to {self.period_end.date()}.\n'
-        result += '#' * 80 + '\n'
-
-        result += f'Net P&L: {format_net_value(self.net_pl)} {self.format_change(self.net_pl_percentage)}%\n'
-        result += f'\tRealised P&L:   {format_net_value(self.net_realised_pl)} ' \
-                  f'{self.format_change(self.net_realised_pl_percentage)}%\n'
-        result += f'\t\tClosed Position(s) Value: {self.total_closed_position_value:.2f}\n'
-        result += f'\t\tClosed Position(s) Cost: ({self.total_closed_position_cost:.2f})\n'
-        result += f'\tUnrealised P&L: {format_net_value(self.net_unrealised_pl)} ' \
-                  f'{self.format_change(self.net_unrealised_pl_percentage)}%\n'
-        result += f'\t\tOpen Position(s) Value:   {self.total_open_position_value:.2f}\n'
-        result += f'\t\tOpen Position(s) Cost:   ({self.total_open_position_cost:.2f})\n'
-        result += '\n'
-
-        result += f'Equity: {self.equity:.2f} {self.format_change(self.equity_change)}% ' \
-                  f'(CAGR: {self.equity_cagr * 100:.2f}%)\n'
-        result += f'\tAccounts Receivable: {format_net_value(self.accounts_receivable)}\n'
-        result += f'\t\tEquities: {self.total_open_position_value:.2f}\n'
-        result += f"\tAvailable Cash: {self.available_cash:.2f}\n"
-        result += f"\t\tNet Contribution: {format_net_value(self.net_contribution)}\n"
-        result += f'\t\t\tDeposits:     {self.total_deposits:.2f}\n'
-        result += f'\t\t\tWithdrawals: ({self.total_withdrawals:.2f})\n'
-        result += f'\t\tNet Income: {format_net_value(self.net_income)}\n'
-        result += f'\t\t\tRevenue:   {self.revenue:.2f}\n'
-        result += f'\t\t\t\tEquities:     {self.total_closed_position_value:.2f}\n'
-        result += f'\t\t\t\tAdjustments:  {self.total_adjustments:.2f}\n'
-        result += f'\t\t\t\t\tDividends:         {self.total_dividends_received:.2f}\n'
-        result += f'\t\t\t\t\tCash Settlements:  {self.total_cash_settlements_received:.2f}\n'
-        result += f'\t\t\tExpenses: ({self.expenses:.2f})\n'
-        result += f'\t\t\t\tTaxes:    ({self.total_taxes:.2f})\n'
-        result += f'\t\t\t\t\tPaid:     ({self.total_taxes_paid:.2f})\n'
-        result += f'\t\t\t\t\tOwing:    ({self.total_taxes_owing:.2f})\n'
-        result += f'\t\t\t\tEquities: ({self.total_position_cost:.2f})\n'
-        result += f'\t\t\t\t\tOpen Positions:   ({self.total_open_position_cost:.2f})\n'
-        result += f'\t\t\t\t\tClosed Positions: ({self.total_closed_position_cost:.2f})\n'
-        result += '\n'
-
-        return result
+        if self._formatted is None:
+            self._formatted = self._format()
+
+        return self._formatted
+
+    def _format(self) -> str:
+        return f"""{self.divider}
+Summary of Portfolio #{self.portfolio_id}
+ held on behalf of {self.portfolio_owner}
+ for the period {self.period_start.date()} to {self.period_end.date()}.
+{self.divider}
+Net P&L: {format_net_value(self.net_pl)} {self.format_change(self.net_pl_percentage)}%
+\tRealised P&L:   {format_net_value(self.net_realised_pl)} {self.format_change(self.net_realised_pl_percentage)}%
+\t\tClosed Position(s) Value: {self.total_closed_position_value:.2f}
+\t\tClosed Position(s) Cost: ({self.total_closed_position_cost:.2f})
+\tUnrealised P&L: {format_net_value(self.net_unrealised_pl)} {self.format_change(self.net_unrealised_pl_percentage)}%
+\t\tOpen Position(s) Value:   {self.total_open_position_value:.2f}
+\t\tOpen Position(s) Cost:   ({self.total_open_position_cost:.2f})
+
+Equity: {self.equity:.2f} {self.format_change(self.equity_change)}% (CAGR: {self.equity_cagr * 100:.2f}%)
+\tAccounts Receivable: {format_net_value(self.accounts_receivable)}
+\t\tEquities: {self.total_open_position_value:.2f}
+\tAvailable Cash: {self.available_cash:.2f}
+\t\tNet Contribution: {format_net_value(self.net_contribution)}
+\t\t\tDeposits:     {self.total_deposits:.2f}
+\t\t\tWithdrawals: ({self.total_withdrawals:.2f})
+\t\tNet Income: {format_net_value(self.net_income)}
+\t\t\tRevenue:   {self.revenue:.2f}
+\t\t\t\tEquities:     {self.total_closed_position_value:.2f}
+\t\t\t\tAdjustments:  {self.total_adjustments:.2f}
+\t\t\t\t\tDividends:         {self.total_dividends_received:.2f}
+\t\t\t\t\tCash Settlements:  {self.total_cash_settlements_received:.2f}
+\t\t\tExpenses: ({self.expenses:.2f})
+\t\t\t\tTaxes:    ({self.total_taxes:.2f})
+\t\t\t\t\tPaid:     ({self.total_taxes_paid:.2f})
+\t\t\t\t\tOwing:    ({self.total_taxes_owing:.2f})
+\t\t\t\tEquities: ({self.total_position_cost:.2f})
+\t\t\t\t\tOpen Positions:   ({self.total_open_position_cost:.2f})
+\t\t\t\t\tClosed Positions: ({self.total_closed_position_cost:.2f})
+
+"""
 
     @staticmethod
     def format_change(value: float) -> str:
@@ -616,10 +673,10 @@ class TaxReport:
         self.short_term_capital_gains: float = 0.0
         self.long_term_capital_gains: float = 0.0
 
-        positions_closed_during_tax_year = filter(
-            lambda p: self.start_of_tax_year <= p.closed_timestamp <= self.end_of_tax_year,
-            portfolio.closed_positions
-        )
+        positions_closed_during_tax_year = [
+            p for p in portfolio.closed_positions
+            if self.start_of_tax_year <= p.closed_timestamp <= self.end_of_tax_year
+        ]
 
         # Capital gains from sale of equities.
         for position in positions_closed_during_tax_year:
@@ -718,11 +775,7 @@ Total Tax Payable: {self.total_tax:.2f}
 
 
 def format_net_value(value: float) -> str:
-    formatted_value = f"{abs(value):.2f}"
-
     if value < 0:
-        formatted_value = f"({formatted_value})"
+        return f"({-value:.2f})"
     else:
-        formatted_value = f" {formatted_value} "
-
-    return formatted_value
+        return f" {abs(value):.2f} "
@@ -1,8 +1,9 @@
 import datetime
+import math
 import sqlite3
-from typing import Tuple, Optional
+from typing import Optional
 
-from AlgoTrader.types import PortfolioID, Ticker, PositionID
+from AlgoTrader.types import PortfolioID, Ticker, PositionID, StockSplitAdjustment
 
 
 # TODO: Sync state with database.
@@ -24,6 +25,12 @@ class Position:
     :attribute is_closed: Whether or not this position has been closed yet.
     """
 
+    __slots__ = (
+        'id', 'portfolio_id', 'ticker', 'quantity', 'entry_price', 'exit_price', 'opened_timestamp',
+        'closed_timestamp', 'dividends_received', 'cash_settlements_received', 'is_closed', '_entry_value',
+        '_exit_value'
+    )
+
     def __init__(self, portfolio_id: PortfolioID, ticker: Ticker,
                  entry_price: float, quantity: int,
                  open_timestamp: datetime.datetime,
@@ -37,6 +44,8 @@ class Position:
         - The `position_id` argument is mainly for batch operations and internal use. If you are creating a single
         position, or creating positions infrequently, using the `db_connection` argument so the ID can be inferred will
         likely result in less rows inserted with duplicate primary keys and less bugs in your code.
+        - The row inserted via `db_connection` is not committed here, the caller is responsible for committing it
+        (e.g. together with the corresponding transaction inside a `with db_connection:` block).
 
         :param portfolio_id: The portfolio this position will belong to.
         :param ticker: The ticker of the security that is being bought.
@@ -61,35 +70,35 @@ class Position:
         self.dividends_received = 0.00
         self.cash_settlements_received = 0.00
         self.is_closed: bool = False
+        # The quantity and prices of a position never change once set (stock splits close the position and open a new
+        # one), so the entry and exit values are calculated once rather than every time they are accessed.
+        self._entry_value: float = quantity * entry_price
+        self._exit_value: Optional[float] = None
 
         if db_connection is not None:
-            with db_connection:
-                cursor = db_connection.execute(
-                    "INSERT INTO position (portfolio_id, ticker) VALUES (?, ?)",
-                    (self.portfolio_id, self.ticker,)
-                )
-
-                self.id = PositionID(cursor.lastrowid)
-                cursor.close()
+            self.id = PositionID(db_connection.execute(
+                "INSERT INTO position (portfolio_id, ticker) VALUES (?, ?)",
+                (self.portfolio_id, self.ticker,)
+            ).lastrowid)
         else:
-            self.id = PositionID(position_id)
+            self.id = position_id
 
     @property
     def entry_value(self) -> float:
         """The value of the position when it was opened."""
-        return self.quantity * self.entry_price
+        return self._entry_value
 
     @property
     def cost(self) -> float:
         """How much the position cost to open."""
-        return self.entry_value
+        return self._entry_value
 
     @property
     def exit_value(self) -> float:
         """The value of the position when it was closed."""
         assert self.is_closed, 'Cannot get the exit value of a position that is still open.'
 
-        return self.quantity * self.exit_price
+        return self._exit_value
 
     @property
     def adjustments(self) -> float:
@@ -99,7 +108,9 @@ class Position:
     @property
     def realised_pl(self) -> float:
         """The realised profit and loss of the position."""
-        return (self.exit_value - self.entry_value) + self.cash_settlements_received
+        assert self.is_closed, 'Cannot get the realised P&L of a position that is still open.'
+
+        return (self._exit_value - self._entry_value) + self.cash_settlements_received
 
     def unrealised_pl(self, current_price) -> float:
         """
@@ -134,7 +145,7 @@ class Position:
         return total_dividend_amount
 
     # TODO: Write unit tests for this... and other stuff while I am at it...
-    def adjust_for_stock_split(self, split_coefficient: float) -> Tuple[float, float, float, float]:
+    def adjust_for_stock_split(self, split_coefficient: float) -> StockSplitAdjustment:
         """
         Adjust this position for a stock split.
 
@@ -143,17 +154,17 @@ class Position:
           settlement of equal value.
 
         :param split_coefficient: The ratio of shares each pre-split share is now worth.
-        :return: A 3-tuple containing: number of whole shares, amount of fractional shares, the adjusted share price
+        :return: A 4-tuple containing: number of whole shares, amount of fractional shares, the adjusted share price
         and cash settlement amount (this may be zero).
         """
         assert not self.is_closed, 'Cannot adjust a closed position for stock split.'
 
-        whole_shares, fractional_shares = divmod(self.quantity * split_coefficient, 1.0)
+        fractional_shares, whole_shares = math.modf(self.quantity * split_coefficient)
         adjusted_price = self.entry_price / split_coefficient
         cash_settlement_amount = fractional_shares * adjusted_price
         self.cash_settlements_received += cash_settlement_amount
 
-        return whole_shares, fractional_shares, adjusted_price, cash_settlement_amount
+        return StockSplitAdjustment(int(whole_shares), fractional_shares, adjusted_price, cash_settlement_amount)
 
     def close(self, price: float, timestamp: datetime.datetime) -> float:
         """
@@ -163,9 +174,10 @@ class Position:
         :param timestamp: The time (and date) that the position is being closed at.
         :return: The value that the position closed at.
         """
-        assert self.is_closed is not True, "Attempt to close a position that has already been closed."
+        assert not self.is_closed, "Attempt to close a position that has already been closed."
 
         self.exit_price = price
+        self._exit_value = self.quantity * price
         self.is_closed = True
         self.closed_timestamp = timestamp
 
@@ -1,6 +1,6 @@
 import datetime
 import enum
-from typing import NewType, Tuple, Callable
+from typing import NewType, Tuple, Callable, NamedTuple
 
 PortfolioID = NewType('PortfolioID', int)
 Ticker = NewType('Ticker', str)
@@ -8,7 +8,7 @@ PositionID = NewType('PositionID', int)
 
 
 # TODO: Grab these from the server.
-class TransactionType(enum.Enum):
+class TransactionType(enum.IntEnum):
     DEPOSIT = enum.auto()
     WITHDRAWAL = enum.auto()
     BUY = enum.auto()
@@ -22,6 +22,14 @@ BuyOrder = Tuple[PortfolioID, Ticker, int, float, datetime.datetime]
 Transaction = Tuple[PortfolioID, PositionID, TransactionType, int, float, datetime.datetime]
 
 
+class StockSplitAdjustment(NamedTuple):
+    """The result of adjusting a position for a stock split."""
+    whole_shares: int
+    fractional_shares: float
+    adjusted_price: float
+    cash_settlement_amount: float
+
+
 @enum.unique
 class Period(enum.Enum):
     DAILY = enum.auto()
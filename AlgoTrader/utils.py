@@ -1,7 +1,8 @@
 import datetime
 import json
 import re
-from typing import Set
+import sqlite3
+from typing import FrozenSet
 
 import plac
 
@@ -35,11 +36,13 @@ def parse_historical_spx_tickers(spx_tickers_file: str, spx_changes_file: str,
     with open(spx_changes_file, 'r') as file:
         spx_changes = json.load(file)
 
-    latest = str(datetime.datetime.fromisoformat(str(datetime.date.today())))
+    # Same format as `str(datetime.datetime)` for midnight, which is how the dates are keyed in the output.
+    latest = f'{datetime.date.today().isoformat()} 00:00:00'
 
     spx_tickers_historical = {
         'tickers': {
-            latest: set(spx_tickers_now)
+            # Stored as sorted lists since JSON doesn't like sets.
+            latest: sorted(spx_tickers_now)
         }
     }
 
@@ -47,40 +50,39 @@ def parse_historical_spx_tickers(spx_tickers_file: str, spx_changes_file: str,
         'tickers': set(spx_tickers_now)
     }
 
-    prev_date = latest
+    # Walk back in time from the current list, undoing one change at a time. Each change only adds/removes a single
+    # ticker, so a single working set is updated in place and only snapshotted for each date.
+    ticker_set = set(spx_tickers_now)
+    # The dates are visited newest to oldest, so the last date visited is the earliest.
+    earliest_spx_date = latest
 
     for date in sorted(spx_changes, reverse=True):
-        date_parts = date.split('-')
-        year, month, day = map(int, date_parts)
-        the_date = datetime.datetime(year, month, day)
+        # The dates are ISO formatted (YYYY-MM-DD, optionally followed by a time), so the output key for midnight on
+        # that day can be built from the date part directly instead of parsing and re-formatting the date.
+        date_key = f'{date[:10]} 00:00:00'
 
-        next_ticker_set = spx_tickers_historical['tickers'][prev_date].copy()
-        spx_tickers_all['tickers'].update(next_ticker_set)
+        added_ticker = spx_changes[date]['added']['ticker']
+        removed_ticker = spx_changes[date]['removed']['ticker']
 
-        if len(spx_changes[date]['added']['ticker']) > 0:
-            next_ticker_set.difference_update([spx_changes[date]['added']['ticker']])
+        if added_ticker:
+            ticker_set.discard(added_ticker)
 
-        if len(spx_changes[date]['removed']['ticker']) > 0:
-            next_ticker_set.update([spx_changes[date]['removed']['ticker']])
+        if removed_ticker:
+            ticker_set.add(removed_ticker)
+            # Any added tickers were already in the list, so only removed tickers can be new to the list of all tickers.
+            spx_tickers_all['tickers'].add(removed_ticker)
 
-        spx_tickers_historical['tickers'][str(the_date)] = set(next_ticker_set)
-        prev_date = str(the_date)
-
-    earliest_spx_date = min(spx_tickers_historical['tickers'])
+        earliest_spx_date = date_key
+        spx_tickers_historical['tickers'][earliest_spx_date] = sorted(ticker_set)
 
     earliest_spx_tickers = {
         'tickers': {
-            # Cast to list since JSON doesn't like sets.
-            earliest_spx_date: list(sorted(spx_tickers_historical['tickers'][earliest_spx_date]))
+            earliest_spx_date: spx_tickers_historical['tickers'][earliest_spx_date]
         }
     }
 
-    spx_tickers_historical['tickers'] = {
-        date: list(sorted(spx_tickers_historical['tickers'][date])) for date in spx_tickers_historical['tickers']
-    }
-
     spx_tickers_all = {
-        'tickers': list(sorted(spx_tickers_all['tickers']))
+        'tickers': sorted(spx_tickers_all['tickers'])
     }
 
     with open(spx_output_file, 'w') as file:
@@ -93,28 +95,56 @@ def parse_historical_spx_tickers(spx_tickers_file: str, spx_changes_file: str,
         json.dump(spx_tickers_all, file)
 
 
-def load_ticker_list_json(ticker_list) -> Set[Ticker]:
+def load_ticker_list_json(ticker_list) -> FrozenSet[Ticker]:
     """
     Load a JSON format list of tickers.
 
     Note: The file is expected to be correctly formatted JSON and have a list
     of tickers contained in a 'tickers' property.
     :param ticker_list: The path to the file that contains the list of tickers.
-    :return: A set of tickers.
+    :return: A (read-only) set of tickers.
     """
     with open(ticker_list, 'r') as file:
         tickers = json.load(file)['tickers']
-        tickers = set(map(lambda ticker: ticker.replace('.', '-'), tickers))
 
-    if len(tickers) == 0:
+    if not tickers:
         raise ValueError("ERROR: Empty ticker list.")
 
-    return tickers
+    return frozenset([ticker.replace('.', '-') for ticker in tickers])
+
+
+def tune_db_connection(db_connection: sqlite3.Connection):
+    """
+    Configure a SQLite connection for the single writer, bulk insert workload of the backtester and data loader.
+
+    Notes:
+    - Write-ahead logging (WAL) lets commits append to a log instead of rewriting the database file, and with
+    `synchronous=NORMAL` the log is only synced on checkpoints rather than on every commit. A power loss may roll back
+    the most recent commits but cannot corrupt the database.
+    - WAL mode is persistent, i.e. it is stored in the database file itself.
+
+    :param db_connection: The connection to configure.
+    """
+    db_connection.execute('PRAGMA journal_mode = WAL')
+    db_connection.execute('PRAGMA synchronous = NORMAL')
+    db_connection.execute('PRAGMA temp_store = MEMORY')
+    # A negative cache size is in KiB, i.e. 64 MiB.
+    db_connection.execute('PRAGMA cache_size = -65536')
 
 
 class Scheduler:
     """An object for scheduling tasks."""
 
+    # noinspection SpellCheckingInspection
+    frequency_pattern = re.compile(r"^(\d+)([dwmqy])$")
+    period_by_suffix = {
+        'd': Period.DAILY,
+        'w': Period.WEEKLY,
+        'm': Period.MONTHLY,
+        'q': Period.QUARTERLY,
+        'y': Period.YEARLY
+    }
+
     def __init__(self, period: Period, frequency: int):
         """
         Create a new scheduler.
@@ -143,20 +173,22 @@ class Scheduler:
 
             months_between = (current_date.year - previous_elapsed_date.year) * 12 + \
                              (current_date.month - previous_elapsed_date.month)
-            quarters_elapsed = months_between / 3
-            period_elapsed = first_month_in_quarter and has_entered_new_month and quarters_elapsed >= self.frequency
-        else:
-            days_elapsed = (current_date - previous_elapsed_date).days
-            weeks_elapsed = days_elapsed / 7
-            years_elapsed = days_elapsed / 365.25
-            months_elapsed = years_elapsed * 12
 
-            period_elapsed = self.period == Period.DAILY and days_elapsed >= self.frequency
-            period_elapsed |= self.period == Period.WEEKLY and weeks_elapsed >= self.frequency
-            period_elapsed |= self.period == Period.MONTHLY and months_elapsed >= self.frequency
-            period_elapsed |= self.period == Period.YEARLY and years_elapsed >= self.frequency
+            return first_month_in_quarter and has_entered_new_month and months_between >= 3 * self.frequency
 
-        return period_elapsed
+        days_elapsed = (current_date - previous_elapsed_date).days
+
+        # The comparisons are done on whole numbers of days to avoid floating point division, e.g. a year is 365.25
+        # days, so `days / 365.25 >= n` is written as `4 * days >= 1461 * n`.
+        if self.period == Period.DAILY:
+            return days_elapsed >= self.frequency
+        elif self.period == Period.WEEKLY:
+            return days_elapsed >= 7 * self.frequency
+        elif self.period == Period.MONTHLY:
+            # A month is taken to be a twelfth of a year, i.e. 365.25 / 12 days.
+            return 48 * days_elapsed >= 1461 * self.frequency
+        else:
+            return 4 * days_elapsed >= 1461 * self.frequency
 
     @staticmethod
     def from_string(schedule_string: str) -> 'Scheduler':
@@ -170,19 +202,15 @@ class Scheduler:
         :return: The constructed Scheduler object.
         :raises: InvalidFrequencyFormatError if the given format string is not valid.
         """
-        # noinspection SpellCheckingInspection
-        valid_periods = 'dwmqy'
+        valid_periods = ''.join(Scheduler.period_by_suffix)
 
-        # noinspection SpellCheckingInspection
-        frequency_pattern = re.compile(r"^(\d+)([dwmqy])$")
-
-        match = re.match(frequency_pattern, schedule_string)
+        match = Scheduler.frequency_pattern.match(schedule_string)
 
         error_message = f"Invalid schedule string format '{schedule_string}'. Valid format is a positive " \
                         f"integer followed by one of: [{', '.join(valid_periods)} - e.g. '1{valid_periods[0]}'."
         try:
             frequency = int(match.group(1))
-            period = str(match.group(2))
+            period = Scheduler.period_by_suffix[match.group(2)]
         except AttributeError:
             # AttributeError raised if match returns None (i.e. no match).
             raise InvalidFrequencyFormatError(error_message)
@@ -191,17 +219,4 @@ class Scheduler:
         if frequency < 1:
             raise InvalidFrequencyFormatError(error_message)
 
-        if period == 'd':
-            period = Period.DAILY
-        elif period == 'w':
-            period = Period.WEEKLY
-        elif period == 'm':
-            period = Period.MONTHLY
-        elif period == 'q':
-            period = Period.QUARTERLY
-        elif period == 'y':
-            period = Period.YEARLY
-        else:
-            raise InvalidFrequencyFormatError(error_message)
-
         return Scheduler(period, frequency)
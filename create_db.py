@@ -1,35 +1,96 @@
 import datetime
+import functools
 import json
 import sqlite3
 import sys
 import time
+from collections import deque
+from typing import Deque
 
 import plac
 import requests
 
-from AlgoTrader.utils import load_ticker_list_json
+from AlgoTrader.utils import load_ticker_list_json, tune_db_connection
+
+# The same SQL string is used for every ticker so that sqlite3 reuses its cached prepared statement.
+INSERT_SQL = '''
+    INSERT OR IGNORE INTO daily_stock_data 
+        (ticker, datetime, open, high, low, close, 
+         adjusted_close, volume, dividend_amount, 
+         split_coefficient, macd_histogram, macd_line, 
+         signal_line) 
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+# The secondary indexes on `daily_stock_data` (as defined in the create script). These are dropped while a new database
+# is bulk loaded and rebuilt once all of the rows have been inserted, which is faster than updating them on every
+# insert.
+DAILY_STOCK_DATA_INDEXES = (
+    'daily_stock_data_dividend_amount_index',
+    'daily_stock_data_datetime_index',
+    'daily_stock_data_ticker_index',
+)
 
 
-def log(msg: str, msg_type='INFO', inplace=False):
+def log(msg: str, msg_type='INFO'):
     assert msg_type in ('INFO', 'WARNING', 'ERROR')
 
     msg = f'[{datetime.datetime.now()}] {msg_type}: {msg}'
 
     file = sys.stdout if msg_type == 'INFO' else sys.stderr
 
-    if inplace:
-        msg = '\r' + msg
-        end = ''
-    else:
-        end = '\n'
+    print(msg, file=file)
 
-    print(msg, file=file, end=end)
 
+class RateLimiter:
+    """
+    Limits the number of requests made within a sliding window of time.
 
-def get_earliest_date(api_url):
+    Unlike counting requests in fixed batches, this only blocks for as long as it takes for the oldest request to leave
+    the window.
+    """
+    # Extra time to wait to allow for the API measuring request times slightly differently to us.
+    margin = 1.0
+
+    def __init__(self, max_requests: int, period: float = 60.0):
+        """
+        Create a new rate limiter.
+
+        :param max_requests: The maximum number of requests that may be made within any window of `period` seconds.
+        :param period: The length of the window in seconds.
+        """
+        assert max_requests > 0, 'The maximum number of requests must be positive.'
+
+        self.max_requests = max_requests
+        self.period = period
+        self.request_times: Deque[float] = deque(maxlen=max_requests)
+
+    def wait(self) -> float:
+        """
+        Block until another request can be made without exceeding the rate limit, and record that request.
+
+        :return: The time spent waiting in seconds, as measured by `time.monotonic()`.
+        """
+        wait_start = time.monotonic()
+
+        if len(self.request_times) == self.max_requests:
+            time_to_wait = self.request_times[0] + self.period + self.margin - wait_start
+
+            if time_to_wait > 0:
+                log(f'Reached maximum number requests for time period ({self.max_requests}/{self.period:.0f}s). '
+                    f'Waiting for {time_to_wait:.1f}s...')
+                time.sleep(time_to_wait)
+
+        now = time.monotonic()
+        self.request_times.append(now)
+
+        return now - wait_start
+
+
+def get_earliest_date(api_url, session: requests.Session):
     """
     Test the API and also get the earliest date for which both stock price and MACD data is available.
     :param api_url: The API url.
+    :param session: The HTTP session to send the requests with.
     :return: the earliest date for which both stock price and MACD data is available.
     """
     stock_price_payload = {
@@ -39,7 +100,7 @@ def get_earliest_date(api_url):
         'apikey': 'demo'
     }
 
-    r = requests.get(api_url, params=stock_price_payload)
+    r = session.get(api_url, params=stock_price_payload)
     r.raise_for_status()
     stock_price_data = r.json()
 
@@ -51,21 +112,36 @@ def get_earliest_date(api_url):
         'apikey': 'demo'
     }
 
-    r = requests.get(api_url, params=macd_payload)
+    r = session.get(api_url, params=macd_payload)
     r.raise_for_status()
     macd_data = r.json()
 
     return max(min(stock_price_data['Time Series (Daily)']), min(macd_data['Technical Analysis: MACD']))
 
 
+@functools.lru_cache(maxsize=None)
+def parse_date(date: str) -> datetime.datetime:
+    """
+    Parse a date from the API data.
+
+    Every ticker's data covers (mostly) the same dates, so each date string is only parsed once per run.
+    :param date: The date string in ISO format.
+    :return: The parsed date.
+    """
+    return datetime.datetime.fromisoformat(date)
+
+
 def gen_rows(stock_price_data, macd_data, from_date):
     ticker = stock_price_data['Meta Data']['2. Symbol']
     macd_ticker = macd_data['Meta Data']['1: Symbol']
 
     assert ticker == macd_ticker, "Both data sources must be for the same ticker."
 
-    for date in filter(lambda datum_date: datum_date >= from_date, stock_price_data['Time Series (Daily)'].keys()):
-        data = (ticker, datetime.datetime.fromisoformat(date))
+    for date in stock_price_data['Time Series (Daily)']:
+        if date < from_date:
+            continue
+
+        data = (ticker, parse_date(date))
 
         try:
             stock_price_datum = stock_price_data['Time Series (Daily)'][date]
@@ -126,10 +202,13 @@ def main(ticker_list: str = 'ticker_lists/djia.json', config_file: str = 'config
     tickers = load_ticker_list_json(ticker_list)
 
     api_url = 'https://www.alphavantage.co/query'
+    # Reuse a single keep-alive connection rather than opening a new TLS connection for every request.
+    session = requests.Session()
     log('Checking demo data for earliest stock data date...')
-    earliest_date = get_earliest_date(api_url)
+    earliest_date = get_earliest_date(api_url, session)
 
     db_connection = sqlite3.connect(config['DATABASE_URL'])
+    tune_db_connection(db_connection)
     db_cursor = db_connection.cursor()
 
     if not append:
@@ -137,107 +216,100 @@ def main(ticker_list: str = 'ticker_lists/djia.json', config_file: str = 'config
             db_cursor.executescript(file.read())
 
     with open(config['DATABASE_CREATE_SCRIPT'], 'r') as file:
-        db_cursor.executescript(file.read())
+        create_script = file.read()
+
+    db_cursor.executescript(create_script)
 
-    batch_start = time.time()
-    num_requests_for_batch = 0
+    if not append:
+        db_cursor.executescript(''.join(f'DROP INDEX IF EXISTS "{index}";\n' for index in DAILY_STOCK_DATA_INDEXES))
+
+    rate_limiter = RateLimiter(max_requests_per_minute)
     num_tickers_processed = 0
 
-    for ticker in tickers:
-        ticker_start = time.time()
-
-        stock_price_payload = {
-            'function': 'TIME_SERIES_DAILY_ADJUSTED',
-            'symbol': ticker,
-            'outputsize': 'full',
-            'apikey': config['API_KEY']
-        }
-
-        macd_payload = {
-            'function': 'MACD',
-            'symbol': ticker,
-            'interval': 'daily',
-            'series_type': 'close',
-            'apikey': config['API_KEY']
-        }
-
-        r = None
-        has_fetched_data = False
-
-        log(f'Fetching data for {ticker}... ')
-
-        while not has_fetched_data:
-            if num_requests_for_batch + 2 > max_requests_per_minute:
-                log(f'Reached maximum number requests for time period ({max_requests_per_minute}/minute).')
-
-                time_to_wait = 60 - int(time.time() - batch_start) + 3
-                time_left = time_to_wait
-
-                while time_left > 0:
-                    log(f'Waiting for {time_left:02d}s...', inplace=True)
-                    time.sleep(1.0)
-                    time_left -= 1
-
-                log(f'Waited for {time_to_wait:02d}s\n', inplace=True)
-                batch_start = time.time()
-                ticker_start = time.time()
-                num_requests_for_batch = 0
-
-            try:
-                r = requests.get(api_url, params=stock_price_payload)
-                num_requests_for_batch += 1
-                r.raise_for_status()
-                stock_price_data = r.json()
-
-                if 'Meta Data' not in stock_price_data:
-                    log(f"Meta data field not found in response: "
-                        f"{stock_price_data} when using URL: '{r.url}'. "
-                        f"Skipping data for {ticker}.", msg_type='WARNING')
-
-                    break
-
-                r = requests.get(api_url, params=macd_payload)
-                num_requests_for_batch += 1
-                r.raise_for_status()
-                macd_data = r.json()
-
-                if 'Meta Data' not in macd_data:
-                    log(f"Meta data field not found in response: "
-                        f"{stock_price_data} when using URL: '{r.url}'. "
-                        f"Skipping data for {ticker}.", msg_type='WARNING')
-
-                    break
-
-                has_fetched_data = True
-            except requests.exceptions.HTTPError as e:
-                log(f'HTTP {e}', msg_type='ERROR')
-                log(f"Encountered error when fetching from '{r.url}'.")
-                log("Retrying in 5 seconds...")
-                time.sleep(5)
-            else:
-                with db_connection:
-                    db_cursor.executemany(
-                        '''
-                        INSERT OR IGNORE INTO daily_stock_data 
-                            (ticker, datetime, open, high, low, close, 
-                             adjusted_close, volume, dividend_amount, 
-                             split_coefficient, macd_histogram, macd_line, 
-                             signal_line) 
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''',
-                        gen_rows(stock_price_data,
-                                 macd_data,
-                                 from_date=earliest_date)
-                    )
-
-        num_tickers_processed += 1
-        ticker_elapsed_time = time.time() - ticker_start
-        elapsed_time_str = time.strftime("%H:%M:%S", time.gmtime(ticker_elapsed_time))
-        log(f'Processed data for {ticker} in {elapsed_time_str}')
-
-    db_connection.commit()
-    db_cursor.close()
-    db_connection.close()
+    try:
+        for ticker in tickers:
+            # The monotonic clock is used since the time spent waiting on the rate limiter is measured with it.
+            ticker_start = time.monotonic()
+            # Time spent waiting on the rate limit is excluded from the time reported for the ticker.
+            time_waited = 0.0
+
+            stock_price_payload = {
+                'function': 'TIME_SERIES_DAILY_ADJUSTED',
+                'symbol': ticker,
+                'outputsize': 'full',
+                'apikey': config['API_KEY']
+            }
+
+            macd_payload = {
+                'function': 'MACD',
+                'symbol': ticker,
+                'interval': 'daily',
+                'series_type': 'close',
+                'apikey': config['API_KEY']
+            }
+
+            r = None
+            has_fetched_data = False
+
+            log(f'Fetching data for {ticker}... ')
+
+            while not has_fetched_data:
+                try:
+                    time_waited += rate_limiter.wait()
+                    r = session.get(api_url, params=stock_price_payload)
+                    r.raise_for_status()
+                    stock_price_data = r.json()
+
+                    if 'Meta Data' not in stock_price_data:
+                        log(f"Meta data field not found in response: "
+                            f"{stock_price_data} when using URL: '{r.url}'. "
+                            f"Skipping data for {ticker}.", msg_type='WARNING')
+
+                        break
+
+                    time_waited += rate_limiter.wait()
+                    r = session.get(api_url, params=macd_payload)
+                    r.raise_for_status()
+                    macd_data = r.json()
+
+                    if 'Meta Data' not in macd_data:
+                        log(f"Meta data field not found in response: "
+                            f"{stock_price_data} when using URL: '{r.url}'. "
+                            f"Skipping data for {ticker}.", msg_type='WARNING')
+
+                        break
+
+                    has_fetched_data = True
+                except requests.exceptions.HTTPError as e:
+                    log(f'HTTP {e}', msg_type='ERROR')
+                    log(f"Encountered error when fetching from '{r.url}'.")
+                    log("Retrying in 5 seconds...")
+                    time.sleep(5)
+                else:
+                    # Build the rows before opening the transaction so that it is only held for the inserts themselves.
+                    rows = list(gen_rows(stock_price_data, macd_data, from_date=earliest_date))
+
+                    with db_connection:
+                        db_cursor.executemany(INSERT_SQL, rows)
+
+            num_tickers_processed += 1
+            ticker_elapsed_time = max(time.monotonic() - ticker_start - time_waited, 0.0)
+            elapsed_time_str = time.strftime("%H:%M:%S", time.gmtime(ticker_elapsed_time))
+            log(f'Processed data for {ticker} in {elapsed_time_str}')
+    finally:
+        try:
+            # Rebuild the indexes even if the load is interrupted so that the database is never left without them.
+            if not append:
+                log('Rebuilding indexes...')
+                # The create script only creates what is missing, so this just recreates the dropped indexes.
+                db_cursor.executescript(create_script)
+                db_cursor.execute('ANALYZE')
+
+            db_connection.commit()
+        finally:
+            db_cursor.close()
+            db_connection.close()
+            session.close()
 
     elapsed_time = time.strftime("%H:%M:%S", time.gmtime(time.time() - start))
     log(f'Processed data for {num_tickers_processed} tickers in {elapsed_time}\n')
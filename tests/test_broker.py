@@ -0,0 +1,112 @@
+import datetime
+import math
+import os
+import sqlite3
+import unittest
+from unittest import mock
+
+from AlgoTrader.broker import Broker
+from AlgoTrader.utils import Scheduler
+
+CREATE_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'create_db.sql')
+
+
+class BrokerPrefetchTest(unittest.TestCase):
+    """Tests for reading the daily stock data through the broker's prefetch buffer."""
+
+    trading_dates = [datetime.datetime(2000, 1, 6), datetime.datetime(2000, 1, 7), datetime.datetime(2000, 1, 10),
+                     datetime.datetime(2000, 1, 11), datetime.datetime(2000, 1, 12)]
+    tickers = ('SPY', 'QQQ')
+
+    daily_data_query = '''
+        SELECT
+            ticker, datetime, open, close,
+            macd_histogram, macd_line, signal_line,
+            split_coefficient, dividend_amount
+        FROM daily_stock_data
+        WHERE datetime = ?
+        '''
+
+    def setUp(self):
+        self.prefetch_queries = []
+
+    def _create_broker(self) -> Broker:
+        """
+        Create a broker over a new test database that records each range query it runs in `prefetch_queries`.
+
+        Note: The broker closes its connection when it is garbage collected, so each broker gets its own database.
+
+        :return: The created broker.
+        """
+        self.db_connection = sqlite3.connect(':memory:')
+
+        with open(CREATE_SCRIPT_PATH, 'r') as file:
+            self.db_connection.executescript(file.read())
+
+        with self.db_connection:
+            self.db_connection.executemany(
+                '''
+                INSERT INTO daily_stock_data
+                    (ticker, datetime, open, close, adjusted_close, low, high, volume, dividend_amount,
+                     split_coefficient, macd_histogram, macd_line, signal_line)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''',
+                [(ticker, date, 100.0 + i, 101.0 + i, 101.0 + i, 99.0 + i, 102.0 + i, 1000, 0.0, 1.0, None, None, None)
+                 for i, date in enumerate(self.trading_dates) for ticker in self.tickers
+                 # The second ticker is missing on one day to check that each day only gets its own rows.
+                 if not (ticker == 'QQQ' and date == self.trading_dates[2])]
+            )
+
+        self.db_connection.set_trace_callback(
+            lambda statement: self.prefetch_queries.append(statement) if 'BETWEEN' in statement else None
+        )
+
+        return Broker(dict(), self.db_connection, Scheduler.from_string('1q'))
+
+    def _query_daily_data(self, date: datetime.datetime) -> dict:
+        """
+        Read the stock data for a single date with a per-date query.
+
+        :param date: The date to read the stock data for.
+        :return: The rows for `date` as tuples, indexed by ticker.
+        """
+        return {row['ticker']: tuple(row) for row in self.db_connection.execute(self.daily_data_query, (date,))}
+
+    def test_non_trading_date_keeps_prefetched_data(self):
+        broker = self._create_broker()
+
+        self.assertEqual(len(self.prefetch_queries), 1)
+
+        # A Saturday between two trading days.
+        broker.update(datetime.datetime(2000, 1, 8))
+
+        self.assertEqual(broker.stock_data, dict())
+        self.assertEqual(len(self.prefetch_queries), 1)
+
+        broker.update(self.trading_dates[2])
+
+        self.assertEqual(broker.stock_data['SPY']['close'], 103.0)
+        self.assertEqual(len(self.prefetch_queries), 1)
+
+    def test_refill_matches_per_date_queries(self):
+        for prefetch_days in (1, 2):
+            with self.subTest(prefetch_days=prefetch_days), mock.patch.object(Broker, 'prefetch_days', prefetch_days):
+                self.prefetch_queries.clear()
+                broker = self._create_broker()
+
+                self.assertEqual({ticker: tuple(row) for ticker, row in broker.stock_data.items()},
+                                 self._query_daily_data(self.trading_dates[0]))
+
+                for today, yesterday in broker.iterate_dates():
+                    broker.update(today)
+
+                    self.assertEqual({ticker: tuple(row) for ticker, row in broker.stock_data.items()},
+                                     self._query_daily_data(today))
+                    self.assertEqual({ticker: tuple(row) for ticker, row in broker.yesterdays_stock_data.items()},
+                                     self._query_daily_data(yesterday))
+
+                self.assertEqual(len(self.prefetch_queries), math.ceil(len(self.trading_dates) / prefetch_days))
+
+
+if __name__ == '__main__':
+    unittest.main()